@@ -1 +0,0 @@
-from .live_view import SpectrometerLiveView 
@@ -0,0 +1,36 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+from libc.math cimport log10
+
+
+def compute_spectra(
+        const float[::1] intensities, 
+        const float[::1] blanking_intensities, 
+        double threshold, 
+        bint absorbance, 
+        float[::1] out,
+        ):
+    """
+    Computes the transmittance, or the absorbance when absorbance is True, in a 
+    single pass over the spectrum. Only points where the blanking intensity is 
+    above threshold are used and the results are written, in order, into out. 
+    Returns the index (into out) and value of the minimum transmittance. As 
+    -log10 is decreasing this is also the index of the maximum absorbance. 
+    """
+    cdef Py_ssize_t i
+    cdef Py_ssize_t j = 0
+    cdef Py_ssize_t min_trans_ind = 0
+    cdef float trans
+    cdef float min_trans = 0.0
+    with nogil:
+        for i in range(intensities.shape[0]):
+            if blanking_intensities[i] > threshold:
+                trans = intensities[i]/blanking_intensities[i]
+                if j == 0 or trans < min_trans:
+                    min_trans = trans
+                    min_trans_ind = j
+                if absorbance:
+                    out[j] = -log10(trans)
+                else:
+                    out[j] = trans
+                j += 1
+    return min_trans_ind, min_trans
@@ -1,14 +1,16 @@
 import os
 import sys
+import math
 import enum
 import signal
 import pickle
+import functools
+import threading
 import collections
 import numpy as np
 import matplotlib as mpl
 import matplotlib.pyplot as plt
-import seabreeze.spectrometers
-from matplotlib.animation import FuncAnimation
+from sb_live_view._spectra import compute_spectra
 
 mpl.rcParams['keymap.pan'].remove('p')
 mpl.rcParams['keymap.save'].remove('s')
@@ -16,6 +18,20 @@ mpl.rcParams['keymap.home'].remove('h')
 mpl.rcParams['keymap.fullscreen'].remove('f')
 
 
+def transmittance_to_absorbance(trans):
+    """
+    Returns -log10(trans) as a float. Like numpy, this gives inf for zero and 
+    nan for negative transmittance rather than raising, and -0.0 is returned
+    as 0.0. 
+    """
+    if trans > 0:
+        return -math.log10(trans) + 0.0
+    elif trans == 0:
+        return math.inf
+    else:
+        return math.nan
+
+
 class SpectrometerLiveView: 
 
     class Mode(enum.Enum):
@@ -70,68 +86,88 @@ class SpectrometerLiveView:
 
     INTENSITY_THRESHOLD = 1
 
+    ANIMATION_INTERVAL = 33  # ms, approx. 30 fps
+
     SAVE_DIRECTORY = 'data'
     DATA_FILENAME = 'data.pkl'
             
     def __init__(self):
 
+        # Imported here as seabreeze is slow to import (usb backend setup) 
+        import seabreeze.spectrometers
         self.spectrometer = seabreeze.spectrometers.Spectrometer.from_first_available()
         self.integ_window = self.INTEG_TIME_PARAM['default']
         self.spectrometer.integration_time_micros(self.integ_window)
-        self.wavelengths = self.spectrometer.wavelengths()
+        self.wavelengths = self.spectrometer.wavelengths().astype(np.float32)
         self.blanking_intensities = None
+        self.blanking_mask = None
+        self.blanking_slice = None
+        self.wavelengths_masked = None
+        self.transmittance_buf = None
+        self.absorbance_buf = None
         self.current_mode = self.Mode.INTENSITY
+        self.set_mode_params()
         self.peakfinder_enabled = False
-        self.data = {}
+        self.background = None
+        self.intensities = None
+        self.minimum_transmittance = None
+        self.maximum_absorbance = None
 
         self.fig, self.ax = plt.subplots(1,1)
-        self.liveview_line, = self.ax.plot([],[], self.LINE_COLOR['liveview'])
+        self.liveview_line, = self.ax.plot([],[], self.LINE_COLOR['liveview'], animated=True)
         self.blanking_line, = self.ax.plot([],[], self.LINE_COLOR['blanking'])
-        self.peakfind_line, = self.ax.plot([],[], self.LINE_COLOR['peak'])
+        self.peakfind_line, = self.ax.plot([],[], self.LINE_COLOR['peak'], animated=True)
+        self.reset_liveview_line()
         
         self.ax.set_xlim(self.wavelengths.min(), self.wavelengths.max()) 
-        self.ax.set_ylim(0, self.YRANGE_PARAM[self.current_mode]['default']) 
+        self.ax.set_ylim(0, self.yrange_default) 
         self.ax.set_xlabel('Wavelength (nm)')
-        self.ax.set_ylabel(self.MODE_TO_YLABEL[self.current_mode])
+        self.ax.set_ylabel(self.ylabel)
         self.ax.grid(True)
 
         self.sigint = False
         signal.signal(signal.SIGINT, self.sigint_handler)
 
-        self.event_key_to_callback = collections.OrderedDict([
-                ('s'    , self.save), 
-                ('f'    , self.save_figure),
-                ('b'    , self.blank),
-                ('c'    , self.clear_blank),
-                ('up'   , self.increase_y_range),
-                ('down' , self.decrease_y_range) ,
-                ('i'    , self.set_mode_to_intensity) ,
-                ('t'    , self.set_mode_to_transmittance), 
-                ('a'    , self.set_mode_to_absorbance),
-                ('p'    , self.toggle_peakfinder),
-                ('.'    , self.increase_integ_window),
-                (','    , self.decrease_integ_window) ,
-                ('h'    , self.print_help),
-                ])
-
-        self.event_key_to_doc = collections.OrderedDict([
-                ('s'    ,   'save data'),
-                ('f'    ,   'save current figure'),
-                ('b'    ,   'acquire blanking data'),
-                ('c'    ,   'clear blanking data'),
-                ('up'   ,   'increase plot y axis range'),
-                ('down' ,   'decrease plot y axis range'),
-                ('i'    ,   'display intensity vs wavelength'),
-                ('t'    ,   'display transmittance vs wavelength'),
-                ('a'    ,   'display absorbance vs wavelength'),
-                ('p'    ,   'toggle on/off peak finder'),
-                ('<'    ,   'increase integration window') ,
-                ('>'    ,   'decrease integration window') ,
-                ('h'    ,   'print help message') ,
-                ('q'    ,   'quit'),
-                ])
+        self.spectrometer_lock = threading.Lock()
+        self.latest_intensities = collections.deque(maxlen=1)
+        self.acquisition_thread = threading.Thread(target=self.acquisition_loop, daemon=True)
+        self.acquisition_thread.start()
+
+        self.event_key_to_callback = {
+                's'    : self.save, 
+                'f'    : self.save_figure,
+                'b'    : self.blank,
+                'c'    : self.clear_blank,
+                'up'   : self.increase_y_range,
+                'down' : self.decrease_y_range,
+                'i'    : functools.partial(self.set_mode, self.Mode.INTENSITY),
+                't'    : functools.partial(self.set_mode, self.Mode.TRANSMITTANCE), 
+                'a'    : functools.partial(self.set_mode, self.Mode.ABSORBANCE),
+                'p'    : self.toggle_peakfinder,
+                '.'    : self.increase_integ_window,
+                ','    : self.decrease_integ_window,
+                'h'    : self.print_help,
+                }
+
+        self.event_key_to_doc = {
+                's'    :   'save data',
+                'f'    :   'save current figure',
+                'b'    :   'acquire blanking data',
+                'c'    :   'clear blanking data',
+                'up'   :   'increase plot y axis range',
+                'down' :   'decrease plot y axis range',
+                'i'    :   'display intensity vs wavelength',
+                't'    :   'display transmittance vs wavelength',
+                'a'    :   'display absorbance vs wavelength',
+                'p'    :   'toggle on/off peak finder',
+                '<'    :   'increase integration window',
+                '>'    :   'decrease integration window',
+                'h'    :   'print help message',
+                'q'    :   'quit',
+                }
 
         self.fig.canvas.mpl_connect('key_press_event', self.on_key_press)
+        self.fig.canvas.mpl_connect('draw_event', self.on_draw)
 
         self.print_help()
 
@@ -141,11 +177,18 @@ class SpectrometerLiveView:
         Switchyard for handling key press events
         """
         #print(event.key)
-        try:
-            self.event_key_to_callback[event.key]()
-        except KeyError:
-            pass
-            #print(f'KeyError: {event.key}')
+        callback = self.event_key_to_callback.get(event.key)
+        if callback is not None:
+            callback()
+
+    def on_draw(self, event):
+        """
+        Cache the axes background, without the animated lines, whenever the
+        full figure is redrawn (axes changes, window resize, etc.).
+        """
+        if self.fig.canvas.is_saving():
+            return
+        self.background = self.fig.canvas.copy_from_bbox(self.ax.bbox)
 
     def save(self):
         """
@@ -153,8 +196,26 @@ class SpectrometerLiveView:
         """
         os.makedirs(self.SAVE_DIRECTORY, exist_ok=True)
         data_file = os.path.join(os.curdir, self.SAVE_DIRECTORY, self.DATA_FILENAME)
+        data = {
+                'mode'              : self.mode_str,
+                'wavelengths'       : self.wavelengths,
+                'intensities'       : self.intensities,
+                'maximum_intensity' : None,
+                }
+        if self.intensities is not None:
+            data['maximum_intensity'] = self.find_max_peak(self.wavelengths, self.intensities)
+        if self.blanking_intensities is not None and self.intensities is not None:
+            self.update_absorbance()
+            self.update_transmittance()
+            data['mask'] = self.blanking_mask
+            data['tramsmittance'] = self.transmittance_buf
+            data['absorbance'] = self.absorbance_buf
+            data['wavelengths_masked'] = self.wavelengths_masked
+            data['minimum_transmittance'] = self.minimum_transmittance
+            data['maximum_absorbance'] = self.maximum_absorbance
+            data['blanking_intensities'] = self.blanking_intensities
         with open(data_file, 'wb') as f:
-            pickle.dump(self.data, f)
+            pickle.dump(data, f)
         print(f'data saved to: {data_file}')
 
     def save_figure(self):
@@ -162,11 +223,10 @@ class SpectrometerLiveView:
         Save figure
         """
         os.makedirs(self.SAVE_DIRECTORY, exist_ok=True)
-        mode_str = self.MODE_TO_YLABEL[self.current_mode].lower()
         if self.peakfinder_enabled: 
-            fig_filename = f'{mode_str}_w_peak.png'
+            fig_filename = f'{self.mode_str}_w_peak.png'
         else:
-            fig_filename = f'{mode_str}.png'
+            fig_filename = f'{self.mode_str}.png'
         fig_filename = os.path.join(os.curdir, self.SAVE_DIRECTORY, fig_filename)
         self.fig.savefig(fig_filename)
         print(f'figure saved to: {fig_filename}')
@@ -176,7 +236,27 @@ class SpectrometerLiveView:
         Save blanking intensities for use during absorbance mode.
         """
         if self.current_mode == self.Mode.INTENSITY:
-            _, self.blanking_intensities  = self.liveview_line.get_data()
+            _, blanking_intensities  = self.liveview_line.get_data()
+            mask = blanking_intensities > self.INTENSITY_THRESHOLD
+            if not mask.any():
+                print("can't acquire blanking data - all intensities below threshold")
+                return
+            # The spectra are only computed over the range spanned by the mask. 
+            # If the mask is contiguous, as it usually is, the masked wavelengths
+            # are a view rather than a copy.
+            lo = int(mask.argmax())
+            hi = mask.size - int(mask[::-1].argmax())
+            self.blanking_intensities = blanking_intensities
+            self.blanking_mask = mask
+            self.blanking_slice = slice(lo, hi)
+            if mask[lo:hi].all():
+                self.wavelengths_masked = self.wavelengths[self.blanking_slice]
+            else:
+                self.wavelengths_masked = self.wavelengths[mask]
+            self.transmittance_buf = np.empty_like(self.wavelengths_masked)
+            self.absorbance_buf = np.empty_like(self.wavelengths_masked)
+            self.update_blanking_line()
+            self.refresh_background()
             print('blanking data acquired')
         else:
             print("can't acquire blanking data - must be in intensity mode")
@@ -187,6 +267,15 @@ class SpectrometerLiveView:
         """
         if self.current_mode == self.Mode.INTENSITY:
             self.blanking_intensities = None
+            self.blanking_mask = None
+            self.blanking_slice = None
+            self.wavelengths_masked = None
+            self.transmittance_buf = None
+            self.absorbance_buf = None
+            self.minimum_transmittance = None
+            self.maximum_absorbance = None
+            self.update_blanking_line()
+            self.refresh_background()
             print('blanking data cleared')
         else:
             print("can't clear blanking data - must be in intensity mode")
@@ -197,8 +286,9 @@ class SpectrometerLiveView:
         Increase the live view plot's y range by one step size.
         """
         y_min, y_max = self.ax.get_ylim()
-        y_max_new = y_max + self.YRANGE_PARAM[self.current_mode]['step']
+        y_max_new = y_max + self.yrange_step
         self.ax.set_ylim(y_min, y_max_new)
+        self.refresh_background()
         print(f'y range = {y_max_new}')
 
     def decrease_y_range(self):
@@ -207,58 +297,83 @@ class SpectrometerLiveView:
         the minimum size is reached. 
         """
         y_min, y_max = self.ax.get_ylim()
-        step = self.YRANGE_PARAM[self.current_mode]['step']
-        minval = self.YRANGE_PARAM[self.current_mode]['min']
-        y_max_new = max(y_max - step, minval)
+        y_max_new = max(y_max - self.yrange_step, self.yrange_min)
         self.ax.set_ylim(y_min, y_max_new)
+        self.refresh_background()
         print(f'y range = {y_max_new}')
 
-    def set_mode_to_intensity(self):
+    def set_mode(self, mode):
         """
-        Set display mode to intensity
+        Set display mode. Transmittance and absorbance modes require blanking data.
         """
-        self.current_mode = self.Mode.INTENSITY
+        if mode != self.Mode.INTENSITY and self.blanking_intensities is None:
+            mode_str = self.MODE_TO_YLABEL[mode].lower()
+            print(f'unable to display {mode_str} - no blanking data')
+            return
+        self.current_mode = mode
+        self.set_mode_params()
+        self.reset_liveview_line()
+        self.update_blanking_line()
         self.reset_y_axis()
 
-    def set_mode_to_transmittance(self):
+    def set_mode_params(self):
         """
-        Set display mode to transmittance
+        Bind the y label, mode name and y range parameters for the current mode
+        to attributes so they aren't looked up in the class dicts on every use.
         """
-        if self.blanking_intensities is None:
-            print('unable to display absorbance - no blanking data')
+        self.ylabel = self.MODE_TO_YLABEL[self.current_mode]
+        self.mode_str = self.ylabel.lower()
+        yrange_param = self.YRANGE_PARAM[self.current_mode]
+        self.yrange_default = yrange_param['default']
+        self.yrange_step = yrange_param['step']
+        self.yrange_min = yrange_param['min']
+
+    def reset_y_axis(self):
+        self.ax.set_ylim(0, self.yrange_default) 
+        self.ax.set_ylabel(self.ylabel)
+        self.refresh_background()
+
+    def reset_liveview_line(self):
+        """
+        Set the live view line's x data for the current mode. The x data only 
+        changes with the mode so update only sets the y data. The y data is
+        filled with NaNs until the next frame. 
+        """
+        if self.current_mode == self.Mode.INTENSITY:
+            x = self.wavelengths
         else:
-            self.current_mode = self.Mode.TRANSMITTANCE
-            self.reset_y_axis()
+            x = self.wavelengths_masked
+        self.liveview_line.set_data(x, np.full_like(x, np.nan))
 
-    def set_mode_to_absorbance(self):
+    def update_blanking_line(self):
         """
-        Set mode to display absorbance
+        Set the blanking line data. The blanking line is only shown in intensity
+        mode and it isn't redrawn each frame, so this is called whenever 
+        the blanking data or mode changes.
         """
-        if self.blanking_intensities is None:
-            print('unable to display absorbance - no blanking data')
+        if self.current_mode == self.Mode.INTENSITY and self.blanking_intensities is not None:
+            self.blanking_line.set_data(self.wavelengths, self.blanking_intensities)
         else:
-            self.current_mode = self.Mode.ABSORBANCE
-            self.reset_y_axis()
+            self.blanking_line.set_data([], [])
 
-    def reset_y_axis(self):
-        self.ax.set_ylim(0, self.YRANGE_PARAM[self.current_mode]['default']) 
-        self.ax.set_ylabel(self.MODE_TO_YLABEL[self.current_mode])
+    def refresh_background(self):
+        """
+        Redraw the full figure, which also recaches the blitting background, so
+        that changes to the axes (limits, labels) show up in the live view. 
+        """
+        self.fig.canvas.draw()
 
     def toggle_peakfinder(self):
-        if self.peakfinder_enabled:
-            try:
-                print(f"max intensity:     {self.data['maximum_intensity']}")
-            except KeyError:
-                pass
-            try:
-                print(f"min transmittance: {self.data['minimum_transmittance']}")
-            except KeyError:
-                pass
-            try:
-                print(f"max absorbance:    {self.data['maximum_absorbance']}")
-            except KeyError:
-                pass
+        if self.peakfinder_enabled and self.intensities is not None:
+            maximum_intensity = self.find_max_peak(self.wavelengths, self.intensities)
+            print(f"max intensity:     {maximum_intensity}")
+            if self.blanking_intensities is not None:
+                self.update_transmittance()
+                print(f"min transmittance: {self.minimum_transmittance}")
+                print(f"max absorbance:    {self.maximum_absorbance}")
         self.peakfinder_enabled = not self.peakfinder_enabled
+        if not self.peakfinder_enabled:
+            self.peakfind_line.set_data([], [])
         print(f'peak finder enabled = {self.peakfinder_enabled}')
 
     def print_help(self):
@@ -279,7 +394,8 @@ class SpectrometerLiveView:
         Increase the spectrometer integration window by one step
         """
         self.integ_window += self.INTEG_TIME_PARAM['step']
-        self.spectrometer.integration_time_micros(self.integ_window)
+        with self.spectrometer_lock:
+            self.spectrometer.integration_time_micros(self.integ_window)
         print(f'integration window = {self.integ_window}')
         
 
@@ -289,82 +405,103 @@ class SpectrometerLiveView:
         """
         self.integ_window -= self.INTEG_TIME_PARAM['step']
         self.integ_window = max(self.integ_window, self.INTEG_TIME_PARAM['min'])
-        self.spectrometer.integration_time_micros(self.integ_window)
+        with self.spectrometer_lock:
+            self.spectrometer.integration_time_micros(self.integ_window)
         print(f'integration window = {self.integ_window}')
 
-    def update(self, frame):
+    def acquisition_loop(self):
+        """
+        Read intensities from the spectrometer in the background, keeping only
+        the most recent spectrum for the live plot. Intensities are converted to 
+        float32 as the spectrometer's ADC is only 16 bit.
+        """
+        while not self.sigint:
+            with self.spectrometer_lock:
+                intensities = self.spectrometer.intensities()
+            self.latest_intensities.append(intensities.astype(np.float32))
+
+    def update(self):
         """
-        Read intensities from sensor and update live plot
+        Get latest intensities from acquisition thread and update live plot
         """
         if self.sigint:
             print('quiting ... googbye')
             exit(0)
 
-        self.data = {}
         line_update_list = []
 
-        # Read data from spectrometer and save in data dict
-        intensities = self.spectrometer.intensities()
-        maximum_intensity = self.find_peak(self.wavelengths, intensities)
-        self.data['mode'] = self.MODE_TO_YLABEL[self.current_mode].lower()
-        self.data['wavelengths'] = self.wavelengths 
-        self.data['intensities'] = intensities 
-        self.data['maximum_intensity'] =  maximum_intensity
-        if self.blanking_intensities is not None:
-            mask = self.blanking_intensities > self.INTENSITY_THRESHOLD
-            transmittance = intensities[mask]/self.blanking_intensities[mask]
-            absorbance = -np.log10(transmittance)
-            wavelengths_masked = self.wavelengths[mask]
-            minimum_transmittance = self.find_peak(wavelengths_masked, transmittance, 'min')
-            maximum_absorbance = self.find_peak(wavelengths_masked, absorbance, 'max')
-            self.data['mask'] = mask
-            self.data['tramsmittance'] = transmittance
-            self.data['absorbance'] = absorbance
-            self.data['wavelengths_masked'] = wavelengths_masked
-            self.data['minimum_transmittance'] = minimum_transmittance
-            self.data['maximum_absorbance'] = maximum_absorbance
-            self.data['blanking_intensities'] = self.blanking_intensities
-
-        # Get liveview, blanking and peakfind x,y data based on mode
-        liveview_x, liveview_y = [], []
-        blanking_x, blanking_y = [], []
-        peakfind_x, peakfind_y = [], []
+        # Get latest spectrum (if any yet)
+        try:
+            intensities = self.latest_intensities[-1]
+        except IndexError:
+            return line_update_list
+        self.intensities = intensities
+
+        # Get liveview and peakfind data based on mode. Only the quantities 
+        # needed for the current mode are computed. 
         if self.current_mode == self.Mode.INTENSITY:
-            liveview_x = self.wavelengths
             liveview_y = intensities
-            peak_x_val, peak_y_val = maximum_intensity
-            if self.blanking_intensities is not None:
-                blanking_x = self.wavelengths
-                blanking_y = self.blanking_intensities
+            if self.peakfinder_enabled:
+                ind = int(intensities.argmax())
+                peak_x_val, peak_y_val = self.wavelengths[ind], intensities[ind]
         elif self.current_mode == self.Mode.TRANSMITTANCE: 
-            liveview_x = self.wavelengths[mask] 
-            liveview_y = transmittance 
-            peak_x_val, peak_y_val = minimum_transmittance
+            self.update_transmittance()
+            liveview_y = self.transmittance_buf 
+            peak_x_val, peak_y_val = self.minimum_transmittance
         elif self.current_mode == self.Mode.ABSORBANCE: 
-            liveview_x = self.wavelengths[mask] 
-            liveview_y = absorbance 
-            peak_x_val, peak_y_val = maximum_absorbance
-        if self.peakfinder_enabled: 
-            peakfind_x = [peak_x_val, peak_x_val]
-            peakfind_y = [0.0, 1.1*peak_y_val.max()]
+            self.update_absorbance()
+            liveview_y = self.absorbance_buf 
+            peak_x_val, peak_y_val = self.maximum_absorbance
 
-        # Update live view and blanking lines
-        self.liveview_line.set_data(liveview_x, liveview_y)
+        # Update live view and peak finder lines. The blanking line only changes
+        # on key presses and is left out so that blitting doesn't redraw it.
+        self.liveview_line.set_ydata(liveview_y)
         line_update_list.append(self.liveview_line)
-        self.blanking_line.set_data(blanking_x, blanking_y)
-        line_update_list.append(self.blanking_line)
-        self.peakfind_line.set_data(peakfind_x, peakfind_y)
-        line_update_list.append(self.peakfind_line)
+        if self.peakfinder_enabled: 
+            peakfind_x = [peak_x_val, peak_x_val]
+            peakfind_y = [0.0, 1.1*peak_y_val]
+            self.peakfind_line.set_data(peakfind_x, peakfind_y)
+            line_update_list.append(self.peakfind_line)
         return line_update_list 
 
-    def find_peak(self, x, y, peak_type='max'):
-        if peak_type == 'max':
-            ind = y.argmax()
-        else:
-            ind = y.argmin()
-        peak_x = x[ind]
-        peak_y = y[ind]
-        return peak_x, peak_y
+    def update_transmittance(self):
+        """
+        Compute transmittance from the latest and blanking intensities along with
+        the minimum transmittance and maximum absorbance.
+        """
+        ind, peak_trans = compute_spectra(
+                self.intensities[self.blanking_slice], 
+                self.blanking_intensities[self.blanking_slice], 
+                self.INTENSITY_THRESHOLD, 
+                False,
+                self.transmittance_buf, 
+                )
+        peak_x = self.wavelengths_masked[ind].item()
+        self.minimum_transmittance = (peak_x, peak_trans)
+        self.maximum_absorbance = (peak_x, transmittance_to_absorbance(peak_trans))
+
+    def update_absorbance(self):
+        """
+        Compute absorbance from the latest and blanking intensities along with
+        the maximum absorbance and minimum transmittance.
+        """
+        ind, peak_trans = compute_spectra(
+                self.intensities[self.blanking_slice], 
+                self.blanking_intensities[self.blanking_slice], 
+                self.INTENSITY_THRESHOLD, 
+                True,
+                self.absorbance_buf, 
+                )
+        peak_x = self.wavelengths_masked[ind].item()
+        self.minimum_transmittance = (peak_x, peak_trans)
+        self.maximum_absorbance = (peak_x, transmittance_to_absorbance(peak_trans))
+
+    def find_max_peak(self, x, y):
+        """
+        Returns the (x, y) location, as floats, of the maximum value of y.
+        """
+        ind = y.argmax()
+        return x[ind].item(), y[ind].item()
 
     def sigint_handler(self, signum, frame):
         """
@@ -372,12 +509,24 @@ class SpectrometerLiveView:
         """
         self.sigint = True
 
+    def draw_frame(self):
+        """
+        Update the live view lines and blit them onto the cached background.
+        """
+        self.fig.canvas.restore_region(self.background)
+        for line in self.update():
+            self.ax.draw_artist(line)
+        self.fig.canvas.blit(self.ax.bbox)
+
     def run(self):
         """
         Start the live view
         """
-        animation = FuncAnimation(self.fig, self.update, interval=1)
-        plt.show()
+        plt.show(block=False)
+        self.refresh_background()
+        while plt.fignum_exists(self.fig.number):
+            self.draw_frame()
+            self.fig.canvas.start_event_loop(self.ANIMATION_INTERVAL/1000)
 
 
 def main():
@@ -0,0 +1,12 @@
+from setuptools import setup, Extension
+from Cython.Build import cythonize
+
+setup(
+    ext_modules = cythonize([
+        Extension(
+            'sb_live_view._spectra', 
+            ['sb_live_view/_spectra.pyx'],
+            extra_compile_args=['-O3'],
+            ),
+        ]),
+    )